@@ -1,11 +1,30 @@
 import streamlit as st
 import os
 import tempfile
-import math
+import io
+import hashlib
+import importlib.util
+import re
+import shutil
+import sqlite3
+import threading
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 warnings.filterwarnings('ignore')
 
+# CTranslate2 reads the OpenMP settings once, when faster-whisper is first imported.
+# Use one thread per physical core; hyperthread siblings only contend for the same units.
+# Without psutil the physical count is unknown, so CTranslate2 keeps its own default.
+try:
+    import psutil
+    CPU_THREADS = psutil.cpu_count(logical=False)
+except ImportError:
+    CPU_THREADS = None
+if CPU_THREADS:
+    os.environ.setdefault("OMP_NUM_THREADS", str(CPU_THREADS))
+    os.environ.setdefault("MKL_NUM_THREADS", str(CPU_THREADS))
+
 # App configuration
 st.set_page_config(
     page_title="Audio Dubbing App",
@@ -79,61 +98,191 @@ LANGUAGE_MAPPING = {
     "Arabic": "ar",
     "Russian": "ru"
 }
+# Built once at import instead of on every Streamlit rerun
+LANGUAGE_NAMES = tuple(LANGUAGE_MAPPING.keys())
+CODE_TO_LANGUAGE = {code: name for name, code in LANGUAGE_MAPPING.items()}
+
+# faster-whisper works on 16 kHz mono audio
+WHISPER_SAMPLE_RATE = 16000
+# Clips shorter than this are transcribed with greedy decoding, longer ones with beam search
+SHORT_CLIP_SECONDS = 180
+# Sidebar decoding choices; None picks the beam size from the clip length
+BEAM_SIZE_OPTIONS = {
+    "Auto (by clip length)": None,
+    "Greedy (fastest)": 1,
+    "Beam search (most accurate)": 5
+}
+
+# Sidebar model choices; None picks distil-small.en for English sources and base otherwise
+WHISPER_MODEL_OPTIONS = {
+    "Auto (by source language)": None,
+    "Base (multilingual, fastest)": "base",
+    "Distil Large v3 (English only)": "distil-large-v3",
+    "Large v3 Turbo (multilingual, most accurate)": "large-v3-turbo"
+}
+# Where model weights are downloaded; point this at a persistent volume so restarts
+# skip the download (unset uses the Hugging Face cache)
+WHISPER_MODEL_DIR = os.environ.get("WHISPER_MODEL_DIR")
+
+# Subtitle lines are joined with this marker so one request can translate many segments
+TRANSLATION_SEPARATOR = "\n¤¤¤\n"
+# Stay comfortably under Google Translate's 5000 character request limit
+TRANSLATION_CHUNK_CHARS = 4000
+# Translations are kept here between runs and app restarts
+TRANSLATION_CACHE_PATH = os.path.join(tempfile.gettempdir(), "dubbing_cache", "translations.sqlite3")
+# Cached translations older than this are requested again
+TRANSLATION_CACHE_TTL = 30 * 24 * 60 * 60
+# Concurrent translation requests; raising this much further tends to trip rate limits
+TRANSLATION_MAX_WORKERS = 8
+
+# Concurrent gTTS requests, and how often a rate-limited (HTTP 429) request is retried
+TTS_MAX_WORKERS = 8
+TTS_MAX_RETRIES = 3
+# gTTS sends text longer than this as several sequential requests, so longer
+# segments are split on sentence boundaries and the pieces synthesized concurrently
+TTS_SPLIT_CHARS = 100
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?।])\s+|(?<=[。！？])')
+
+# MPEG Layer III bitrates (kbps) by bitrate index, for MPEG-1 and for MPEG-2/2.5
+MP3_BITRATES_MPEG1 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MP3_BITRATES_MPEG2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+# Sample rates (Hz) by MPEG version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000]
+}
+
+# Each progress redraw is a websocket message; refresh at most this often (seconds)
+PROGRESS_UPDATE_INTERVAL = 0.5
 
+@st.cache_resource(show_spinner=False)
 def check_dependencies():
-    """Check if all required packages are available"""
+    """Check if all required packages are available (once per process)"""
     missing_packages = []
     
     required_packages = {
         "faster-whisper": "faster_whisper",
         "googletrans": "googletrans",
-        "gtts": "gtts",
-        "pysrt": "pysrt"
+        "gtts": "gtts"
     }
     
+    # Locate the packages without importing them; the heavy ML imports are
+    # deferred to the functions that use them so the first page renders quickly
     for package, import_name in required_packages.items():
-        try:
-            __import__(import_name)
-        except ImportError:
+        if importlib.util.find_spec(import_name) is None:
             missing_packages.append(package)
     
     return missing_packages
 
 def format_time(seconds):
     """Convert seconds to SRT time format"""
-    hours = math.floor(seconds / 3600)
-    seconds %= 3600
-    minutes = math.floor(seconds / 60)
-    seconds %= 60
-    milliseconds = round((seconds - math.floor(seconds)) * 1000)
-    seconds = math.floor(seconds)
-    formatted_time = f"{hours:02d}:{minutes:02d}:{seconds:01d},{milliseconds:03d}"
-    return formatted_time
-
-def transcribe_audio(audio_path):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+@st.cache_resource
+def get_background_executor():
+    """Thread pool for work that can overlap with the UI (e.g. model loading)"""
+    return ThreadPoolExecutor(max_workers=2)
+
+@st.cache_data(show_spinner=False)
+def nvidia_driver_present():
+    """Cheap hint for the sidebar: look for the NVIDIA driver without importing CTranslate2"""
+    return os.path.exists("/dev/nvidiactl") or shutil.which("nvidia-smi") is not None
+
+@st.cache_data(show_spinner=False)
+def cuda_available():
+    """Check whether CTranslate2 can see a CUDA device"""
+    try:
+        import ctranslate2
+        return ctranslate2.get_cuda_device_count() > 0
+    except Exception:
+        return False
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_whisper_model(model_name="base", use_gpu=False):
+    """Load a faster-whisper transcription model once per process"""
+    from faster_whisper import WhisperModel
+    
+    # The sidebar only checks for a driver; confirm CTranslate2 can use it here, off the
+    # script thread, and fall back to the CPU if it cannot
+    if use_gpu and cuda_available():
+        # int8 weights with float16 activations: half the weight traffic of float16
+        return WhisperModel(
+            model_name,
+            device="cuda",
+            compute_type="int8_float16",
+            download_root=WHISPER_MODEL_DIR
+        )
+    
+    # int8 weights quarter the memory traffic and use the CPU's int8 GEMM kernels
+    return WhisperModel(
+        model_name,
+        device="cpu",
+        compute_type="int8",
+        cpu_threads=CPU_THREADS or 0,
+        num_workers=1,
+        download_root=WHISPER_MODEL_DIR
+    )
+
+def prewarm_whisper_model(model_name, use_gpu):
+    """Load a model into the cache without holding on to it, so eviction can free it"""
+    get_whisper_model(model_name, use_gpu)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def run_transcription(content_key, model_name, use_gpu, _audio_file, batch_size, beam_size=None):
+    """Transcribe audio and return plain, cacheable results (keyed by content_key and model_name)"""
+    from faster_whisper import BatchedInferencePipeline, decode_audio
+    
+    audio = decode_audio(_audio_file, sampling_rate=WHISPER_SAMPLE_RATE)
+    duration = len(audio) / WHISPER_SAMPLE_RATE
+    
+    # Greedy decoding is as accurate as beam search on short clips, at a fraction of the cost
+    if beam_size is None:
+        beam_size = 1 if duration < SHORT_CLIP_SECONDS else 5
+    
+    # Silero VAD drops silent stretches and splits speech into chunks that are
+    # decoded batch_size at a time instead of one window after another.
+    # The batched pipeline skips timestamps by default, which would return each VAD
+    # chunk (up to 30 s) as one segment; keep them for sentence-level segments.
+    # A cache hit once prewarmed; otherwise this waits for (or retries) the load
+    pipeline = BatchedInferencePipeline(model=get_whisper_model(model_name, use_gpu))
+    segments, info = pipeline.transcribe(
+        audio,
+        batch_size=batch_size,
+        beam_size=beam_size,
+        without_timestamps=False,
+        vad_filter=True,
+        vad_parameters=dict(min_silence_duration_ms=500)
+    )
+    
+    language_probability = getattr(info, 'language_probability', 'N/A')
+    segments = [
+        {'start': segment.start, 'end': segment.end, 'text': segment.text.strip()}
+        for segment in segments
+    ]
+    return info.language, language_probability, segments
+
+def transcribe_audio(audio_file, content_key, model_name, use_gpu, batch_size, beam_size=None):
     """Transcribe audio using faster-whisper"""
     try:
-        from faster_whisper import WhisperModel
-        
-        st.info("Loading transcription model...")
-        model = WhisperModel("base")
-        
         st.info("Transcribing audio...")
-        segments, info = model.transcribe(audio_path)
-        
-        language = info.language
-        language_probability = getattr(info, 'language_probability', 'N/A')
+        language, language_probability, segments = run_transcription(
+            content_key, model_name, use_gpu, audio_file, batch_size, beam_size
+        )
         
         st.success(f"Detected language: {language} (confidence: {language_probability})")
         
-        segments = list(segments)
         st.write(f"Found {len(segments)} segments")
         
         # Display first few segments for verification
         with st.expander("Preview Original Transcription"):
             for i, segment in enumerate(segments[:5]):
-                st.write(f"**Segment {i+1}:** {segment.text}")
-                st.write(f"Time: {segment.start:.2f}s - {segment.end:.2f}s")
+                st.write(f"**Segment {i+1}:** {segment['text']}")
+                st.write(f"Time: {segment['start']:.2f}s - {segment['end']:.2f}s")
                 st.write("---")
         
         return language, segments
@@ -143,181 +292,453 @@ def transcribe_audio(audio_path):
         st.info("Try using a different audio file or check the audio format.")
         return None, None
 
-def generate_subtitle_file(segments, subtitle_path):
-    """Generate subtitle file from segments"""
-    try:
-        text = ""
-        for index, segment in enumerate(segments):
-            segment_start = format_time(segment.start)
-            segment_end = format_time(segment.end)
-            text += f"{str(index+1)} \n"
-            text += f"{segment_start} --> {segment_end} \n"
-            text += f"{segment.text} \n"
-            text += "\n"
+def build_srt(segments):
+    """Render segments as SRT subtitle text"""
+    return "".join(
+        f"{index+1}\n"
+        f"{format_time(segment['start'])} --> {format_time(segment['end'])}\n"
+        f"{segment['text']}\n"
+        "\n"
+        for index, segment in enumerate(segments)
+    )
 
-        with open(subtitle_path, "w", encoding="utf-8") as f:
-            f.write(text)
-        
-        st.success(f"Subtitles generated with {len(segments)} segments")
-        return True
-        
-    except Exception as e:
-        st.error(f"Subtitle generation error: {str(e)}")
-        return False
+@st.cache_resource
+def get_translator():
+    """Shared googletrans client; its HTTP/2 connection is kept alive across calls and reruns"""
+    from googletrans import Translator
+    
+    # By default a failed request (e.g. HTTP 429) silently returns the input text,
+    # which would then be cached as its own translation
+    return Translator(timeout=10, raise_exception=True)
+
+@st.cache_resource
+def get_translation_cache():
+    """On-disk store of translations keyed by (text, source_lang, target_lang)"""
+    os.makedirs(os.path.dirname(TRANSLATION_CACHE_PATH), exist_ok=True)
+    connection = sqlite3.connect(TRANSLATION_CACHE_PATH, check_same_thread=False)
+    # Versioned table name: rows from the unversioned table may hold untranslated text
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS translations_v2 ("
+        "text TEXT, source_lang TEXT, target_lang TEXT, translation TEXT, created_at REAL, "
+        "PRIMARY KEY (text, source_lang, target_lang))"
+    )
+    return connection
+
+@st.cache_resource
+def get_translation_cache_lock():
+    """Serializes use of the shared cache connection across session threads"""
+    return threading.Lock()
+
+def load_cached_translations(texts, source_lang, target_lang):
+    """Return previously stored, unexpired translations of texts, keyed by original text"""
+    connection = get_translation_cache()
+    oldest = time.time() - TRANSLATION_CACHE_TTL
+    translations = {}
+    with get_translation_cache_lock():
+        for text in set(texts):
+            row = connection.execute(
+                "SELECT translation FROM translations_v2 "
+                "WHERE text = ? AND source_lang = ? AND target_lang = ? AND created_at >= ?",
+                (text, source_lang, target_lang, oldest)
+            ).fetchone()
+            if row:
+                translations[text] = row[0]
+    return translations
+
+def save_translations(translations, source_lang, target_lang):
+    """Store new translations so later runs (and restarts) can reuse them"""
+    connection = get_translation_cache()
+    now = time.time()
+    with get_translation_cache_lock(), connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO translations_v2 VALUES (?, ?, ?, ?, ?)",
+            [
+                (text, source_lang, target_lang, translation, now)
+                for text, translation in translations.items()
+            ]
+        )
+
+def chunk_texts(texts, max_chars=TRANSLATION_CHUNK_CHARS):
+    """Group consecutive text indices so each joined group stays under max_chars"""
+    chunks = []
+    current = []
+    current_length = 0
+    
+    for i, text in enumerate(texts):
+        length = len(text) + len(TRANSLATION_SEPARATOR)
+        if current and current_length + length > max_chars:
+            chunks.append(current)
+            current = []
+            current_length = 0
+        current.append(i)
+        current_length += length
+    
+    if current:
+        chunks.append(current)
+    return chunks
+
+def translate_batch(translator, texts, source_lang, target_lang):
+    """Translate several texts with a single request, falling back to one request per text"""
+    translation = translator.translate(TRANSLATION_SEPARATOR.join(texts), src=source_lang, dest=target_lang)
+    parts = [part.strip() for part in translation.text.split(TRANSLATION_SEPARATOR.strip())]
+    
+    # The marker did not survive the round-trip intact, translate each text on its own.
+    # A line that still fails comes back as None and keeps its original text.
+    if len(parts) != len(texts) or not all(parts):
+        parts = []
+        for text in texts:
+            try:
+                parts.append(translator.translate(text, src=source_lang, dest=target_lang).text)
+            except Exception:
+                parts.append(None)
+    
+    return parts
 
-def translate_subtitles_googletrans(subtitle_path, translated_subtitle_path, target_lang, source_lang="auto"):
-    """Translate subtitles using googletrans (more reliable)"""
+def translate_subtitles_googletrans(segments, target_lang, source_lang="auto"):
+    """Translate segment texts using googletrans (more reliable)"""
     try:
-        import pysrt
-        from googletrans import Translator
-        
         st.info(f"Translating from {source_lang} to {target_lang}...")
         
-        subs = pysrt.open(subtitle_path)
-        translator = Translator()
+        translator = get_translator()
         
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        translated_count = 0
-        original_texts = []
-        translated_texts = []
+        original_texts = [segment['text'] for segment in segments]
         
-        for i, sub in enumerate(subs):
-            try:
-                original_text = sub.text
-                original_texts.append(original_text)
-                
-                # Translate using googletrans
-                translation = translator.translate(original_text, src=source_lang, dest=target_lang)
-                
-                if translation and translation.text:
-                    sub.text = translation.text
-                    translated_texts.append(translation.text)
-                    translated_count += 1
-                    
-                    # Show translation preview for first few segments
-                    if i < 3:
-                        st.write(f"**Original:** {original_text}")
-                        st.write(f"**Translated:** {translation.text}")
-                        st.write("---")
+        # Only send each distinct line once, and skip lines translated in earlier runs
+        translations = load_cached_translations(original_texts, source_lang, target_lang)
+        # Empty lines are never sent: they would break the batch split and have nothing to translate
+        pending_texts = list(dict.fromkeys(
+            text for text in original_texts if text and text not in translations
+        ))
+        new_translations = {}
+        
+        # Send segments in batches, and the batches concurrently, to cut down on HTTP round-trips
+        chunks = chunk_texts(pending_texts)
+        done_lines = 0
+        with ThreadPoolExecutor(max_workers=min(TRANSLATION_MAX_WORKERS, len(chunks) or 1)) as executor:
+            futures = {
+                executor.submit(
+                    translate_batch,
+                    translator,
+                    [pending_texts[i] for i in chunk],
+                    source_lang,
+                    target_lang
+                ): chunk
+                for chunk in chunks
+            }
+            
+            last_update = 0.0
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    for i, text in zip(chunk, future.result()):
+                        if text:
+                            new_translations[pending_texts[i]] = text
+                except Exception as e:
+                    st.warning(f"Could not translate a batch of {len(chunk)} segments: {str(e)}")
                 
-                progress = (i + 1) / len(subs)
-                progress_bar.progress(progress)
-                status_text.text(f"Translating segment {i+1}/{len(subs)}")
+                done_lines += len(chunk)
+                if time.monotonic() - last_update >= PROGRESS_UPDATE_INTERVAL:
+                    progress = done_lines / len(pending_texts)
+                    progress_bar.progress(progress)
+                    status_text.text(f"Translating unique line {done_lines}/{len(pending_texts)}")
+                    last_update = time.monotonic()
+        
+        save_translations(new_translations, source_lang, target_lang)
+        translations.update(new_translations)
+        translated_texts = [translations.get(text) for text in original_texts]
+        
+        translated_segments = []
+        translated_count = 0
+        for i, segment in enumerate(segments):
+            translated_segments.append({**segment, 'text': translated_texts[i] or segment['text']})
+            if translated_texts[i]:
+                translated_count += 1
                 
-            except Exception as e:
-                st.warning(f"Could not translate segment {i+1}: {str(e)}")
-                continue
+                # Show translation preview for first few segments
+                if i < 3:
+                    st.write(f"**Original:** {original_texts[i]}")
+                    st.write(f"**Translated:** {translated_texts[i]}")
+                    st.write("---")
         
-        subs.save(translated_subtitle_path, encoding='utf-8')
         progress_bar.empty()
         status_text.empty()
         
         # Show translation summary
         with st.expander("View Translation Summary"):
-            st.write(f"**Total segments:** {len(subs)}")
+            st.write(f"**Total segments:** {len(segments)}")
             st.write(f"**Successfully translated:** {translated_count}")
             if original_texts and translated_texts:
                 st.write("**Sample translations:**")
                 for i in range(min(3, len(original_texts))):
                     st.write(f"{i+1}. **Original:** {original_texts[i]}")
-                    st.write(f"   **Translated:** {translated_texts[i]}")
+                    st.write(f"   **Translated:** {translated_texts[i] or original_texts[i]}")
         
-        st.success(f"Translated {translated_count}/{len(subs)} segments successfully")
-        return True
+        st.success(f"Translated {translated_count}/{len(segments)} segments successfully")
+        return translated_segments
         
     except Exception as e:
         st.error(f"Translation error: {str(e)}")
-        return False
+        return None
 
-def generate_individual_audio_files(translated_subtitle_path, temp_dir, target_lang):
-    """Generate individual audio files for each segment using gTTS"""
+def synthesize_speech(text, lang):
+    """Synthesize text with gTTS and return the MP3 bytes, backing off when rate limited"""
+    from gtts import gTTS, gTTSError
+    
+    for attempt in range(TTS_MAX_RETRIES + 1):
+        try:
+            buffer = io.BytesIO()
+            gTTS(text=text, lang=lang, slow=False).write_to_fp(buffer)
+            return buffer.getvalue()
+        except gTTSError as e:
+            status_code = getattr(getattr(e, 'rsp', None), 'status_code', None)
+            if status_code != 429 or attempt == TTS_MAX_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
+
+def split_for_tts(text, max_chars=TTS_SPLIT_CHARS):
+    """Split long text into sentence groups of at most max_chars (where sentences allow)"""
+    if len(text) <= max_chars:
+        return [text]
+    
+    # Keep each sentence's trailing whitespace so the pieces read as they were written
+    sentences = []
+    start = 0
+    for boundary in SENTENCE_BOUNDARY.finditer(text):
+        sentences.append(text[start:boundary.end()])
+        start = boundary.end()
+    sentences.append(text[start:])
+    
+    pieces = []
+    current = ""
+    for sentence in sentences:
+        if current.strip() and len((current + sentence).strip()) > max_chars:
+            pieces.append(current.strip())
+            current = ""
+        current += sentence
+    if current.strip():
+        pieces.append(current.strip())
+    return pieces
+
+def generate_individual_audio_files(segments, target_lang):
+    """Generate individual audio segments for each subtitle using gTTS"""
     try:
-        import pysrt
-        from gtts import gTTS
-        
         st.info("Generating audio segments...")
         
-        subs = pysrt.open(translated_subtitle_path)
         audio_files = []
         
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        successful_segments = 0
-        for i, sub in enumerate(subs):
-            text = sub.text.strip()
-            
-            if text and len(text) > 1:
-                try:
-                    # Generate speech using gTTS
-                    tts = gTTS(text=text, lang=target_lang, slow=False)
-                    
-                    # Save to individual file
-                    audio_file_path = os.path.join(temp_dir, f"segment_{i}.mp3")
-                    tts.save(audio_file_path)
-                    
-                    # Check if file was created successfully
-                    if os.path.exists(audio_file_path) and os.path.getsize(audio_file_path) > 0:
-                        audio_files.append({
-                            'path': audio_file_path,
-                            'start_time': sub.start.ordinal / 1000.0,
-                            'text': text,
-                            'index': i
-                        })
-                        successful_segments += 1
-                    else:
-                        st.warning(f"Audio file for segment {i+1} was not created properly")
-                    
-                except Exception as e:
-                    st.warning(f"Could not generate audio for segment {i+1}: {str(e)}")
+        # Each gTTS call is a blocking HTTP request, so synthesize segments concurrently.
+        # Long segments are split into sentences, and repeated text is synthesized once.
+        with ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS) as executor:
+            futures_by_text = {}
+            segment_pieces = []
+            for i, segment in enumerate(segments):
+                text = segment['text'].strip()
+                if not text or len(text) < 2:
                     continue
+                
+                pieces = split_for_tts(text)
+                for piece in pieces:
+                    if piece not in futures_by_text:
+                        futures_by_text[piece] = executor.submit(synthesize_speech, piece, target_lang)
+                segment_pieces.append((i, segment, text, pieces))
             
-            progress = (i + 1) / len(subs)
-            progress_bar.progress(progress)
-            status_text.text(f"Generating audio segment {i+1}/{len(subs)}")
+            last_update = 0.0
+            total = len(futures_by_text)
+            for completed, _ in enumerate(as_completed(futures_by_text.values()), start=1):
+                if time.monotonic() - last_update >= PROGRESS_UPDATE_INTERVAL:
+                    progress_bar.progress(completed / total)
+                    status_text.text(
+                        f"Synthesizing speech request {completed}/{total} "
+                        f"({len(segment_pieces)} segments)"
+                    )
+                    last_update = time.monotonic()
+        
+        for i, segment, text, pieces in segment_pieces:
+            try:
+                parts = [futures_by_text[piece].result() for piece in pieces]
+                if len(parts) == 1:
+                    audio_data = parts[0]
+                else:
+                    # MP3 frames are self-contained, so the pieces play back to back once untagged
+                    audio_data = b"".join(strip_id3_tags(part) for part in parts)
+                
+                if audio_data:
+                    audio_files.append({
+                        'data': audio_data,
+                        'start_time': segment['start'],
+                        'text': text,
+                        'index': i
+                    })
+                else:
+                    st.warning(f"Audio for segment {i+1} was not created properly")
+                
+            except Exception as e:
+                st.warning(f"Could not generate audio for segment {i+1}: {str(e)}")
         
         progress_bar.empty()
         status_text.empty()
         
-        st.success(f"Generated {successful_segments} audio segments")
+        st.success(f"Generated {len(audio_files)} audio segments")
         return audio_files
         
     except Exception as e:
         st.error(f"Audio segment generation error: {str(e)}")
         return []
 
-def create_audio_download_page(audio_files, target_lang, original_lang):
-    """Create a download page for individual audio files"""
+def strip_id3_tags(data):
+    """Remove a leading ID3v2 tag and a trailing ID3v1 tag from MP3 bytes"""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # The tag size is a synchsafe integer: 7 significant bits per byte
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    
+    return data
+
+def parse_mp3_frame_header(data, offset):
+    """Return (frame_length, samples, sample_rate) of the Layer III frame at offset, or None"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    
+    version = (data[offset + 1] >> 3) & 0x03
+    layer = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    if version == 3:
+        samples = 1152
+        bitrate = MP3_BITRATES_MPEG1[bitrate_index] * 1000
+    else:
+        samples = 576
+        bitrate = MP3_BITRATES_MPEG2[bitrate_index] * 1000
+    
+    frame_length = samples // 8 * bitrate // sample_rate + padding
+    return frame_length, samples, sample_rate
+
+def find_mp3_frames(data):
+    """Locate the audio frames in MP3 bytes as (offset, samples, sample_rate) tuples"""
+    frames = []
+    offset = 0
+    while offset + 4 <= len(data):
+        header = parse_mp3_frame_header(data, offset)
+        if header is None:
+            # Not a frame boundary, resynchronise on the next byte
+            offset += 1
+            continue
+        
+        frame_length, samples, sample_rate = header
+        frames.append((offset, samples, sample_rate))
+        offset += frame_length
+    
+    return frames
+
+def build_silent_frame(header):
+    """Build one silent MP3 frame with the same format as the given 4-byte frame header"""
+    # Mark the frame as unprotected (no CRC) and unpadded; an all-zero side info and
+    # main data block then decodes to silence
+    header = bytes([header[0], header[1] | 0x01, header[2] & ~0x02 & 0xFF, header[3]])
+    frame_length, samples, sample_rate = parse_mp3_frame_header(header, 0)
+    return header + bytes(frame_length - 4), samples / sample_rate
+
+def combine_audio_segments(audio_files):
+    """Splice the MP3 segments into one track, padding with silent frames so each starts on time"""
+    parts = []
+    position = 0.0
+    silent_frame = None
+    
+    for audio_file in audio_files:
+        data = strip_id3_tags(audio_file['data'])
+        frames = find_mp3_frames(data)
+        if not frames:
+            continue
+        
+        first_offset = frames[0][0]
+        if silent_frame is None:
+            silent_frame, silent_seconds = build_silent_frame(data[first_offset:first_offset + 4])
+        
+        # Pad up to the segment's start time; segments that run late are played back to back
+        silent_frames = int((audio_file['start_time'] - position) / silent_seconds)
+        if silent_frames > 0:
+            parts.append(silent_frame * silent_frames)
+            position += silent_frames * silent_seconds
+        
+        parts.append(data[first_offset:])
+        position += sum(samples / sample_rate for _, samples, sample_rate in frames)
+    
+    return b"".join(parts)
+
+def create_audio_download_page(audio_files, target_lang, target_lang_code, original_lang, original_segments, translated_segments):
+    """Create a download page for individual audio files and the subtitles"""
     st.header("🎵 Generated Audio Segments")
     st.success(f"Successfully translated from {original_lang} to {target_lang}!")
     st.info("""
-    **Download individual audio segments below.** 
-    You can combine them using free online tools like AudioJoiner.com or desktop software like Audacity.
+    **Download the combined dub or the individual audio segments below.** 
+    The combined track places each segment at its original start time.
     """)
     
+    # MP3 frames are self-contained, so the segments are joined without re-encoding
+    combined_audio = combine_audio_segments(audio_files)
+    if combined_audio:
+        st.audio(combined_audio, format='audio/mp3')
+        st.download_button(
+            label="🎧 Download Combined Dub (MP3)",
+            data=combined_audio,
+            file_name=f"dubbed_audio_{target_lang_code}.mp3",
+            mime="audio/mp3",
+            type="primary"
+        )
+    
     # Create a zip file with all segments
     import zipfile
     
-    zip_path = os.path.join(tempfile.gettempdir(), f"audio_segments_{target_lang}.zip")
-    
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
+    # Build the archive in memory; Streamlit needs the bytes anyway, and a shared
+    # temp path would be overwritten by concurrent sessions
+    zip_buffer = io.BytesIO()
+    # MP3 data is already compressed, so deflating it again only costs CPU
+    with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED) as zipf:
         for audio_file in audio_files:
-            zipf.write(audio_file['path'], os.path.basename(audio_file['path']))
+            zipf.writestr(f"segment_{audio_file['index']}.mp3", audio_file['data'])
+    zip_data = zip_buffer.getvalue()
     
     # Download all segments as zip
-    with open(zip_path, "rb") as f:
-        zip_data = f.read()
-    
     st.download_button(
         label="📦 Download All Segments (ZIP)",
         data=zip_data,
-        file_name=f"audio_segments_{target_lang}.zip",
-        mime="application/zip",
-        type="primary"
+        file_name=f"audio_segments_{target_lang_code}.zip",
+        mime="application/zip"
     )
     
+    # Subtitles are only rendered to SRT here, where the user actually downloads them
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="📝 Original Subtitles (SRT)",
+            data=build_srt(original_segments),
+            file_name=f"subtitles_{original_lang}.srt",
+            mime="application/x-subrip"
+        )
+    with col2:
+        st.download_button(
+            label="📝 Translated Subtitles (SRT)",
+            data=build_srt(translated_segments),
+            file_name=f"subtitles_{target_lang_code}.srt",
+            mime="application/x-subrip"
+        )
+    
     st.markdown("---")
     
     # Individual segment downloads
@@ -332,24 +753,21 @@ def create_audio_download_page(audio_files, target_lang, original_lang):
         
         with col2:
             # Play button
-            with open(audio_file['path'], "rb") as f:
-                audio_bytes = f.read()
-            st.audio(audio_bytes, format='audio/mp3')
+            st.audio(audio_file['data'], format='audio/mp3')
         
         with col3:
             # Download button
-            with open(audio_file['path'], "rb") as f:
-                st.download_button(
-                    label="📥 Download",
-                    data=f,
-                    file_name=f"segment_{audio_file['index'] + 1}_{target_lang}.mp3",
-                    mime="audio/mp3",
-                    key=f"download_{audio_file['index']}"
-                )
+            st.download_button(
+                label="📥 Download",
+                data=audio_file['data'],
+                file_name=f"segment_{audio_file['index'] + 1}_{target_lang_code}.mp3",
+                mime="audio/mp3",
+                key=f"download_{audio_file['index']}"
+            )
     
-    # Provide instructions for combining
+    # Provide instructions for combining segments by hand (e.g. with custom timing)
     st.markdown("---")
-    st.subheader("🔧 How to Combine Audio Segments")
+    st.subheader("🔧 How to Combine Audio Segments Yourself")
     st.markdown("""
     **Easy Online Tools:**
     - [AudioJoiner.com](https://audio-joiner.com/) - Free, no installation needed
@@ -383,10 +801,10 @@ def main():
         st.markdown("""
         ### 📋 Required packages for `requirements.txt`:
         ```txt
-        faster-whisper>=0.9.0
+        faster-whisper>=1.1.0
         googletrans==3.1.0a0
         gtts>=2.3.2
-        pysrt>=1.1.2
+        psutil
         ```
         """)
         return
@@ -398,16 +816,68 @@ def main():
     st.sidebar.markdown("### Language Settings")
     source_lang = st.sidebar.selectbox(
         "Source Language (auto-detected)",
-        ["Auto-detect"] + list(LANGUAGE_MAPPING.keys()),
+        ("Auto-detect",) + LANGUAGE_NAMES,
         index=0
     )
     
     target_lang = st.sidebar.selectbox(
         "Target Language (for dubbing)",
-        list(LANGUAGE_MAPPING.keys()),
+        LANGUAGE_NAMES,
         index=0  # Default to English
     )
     
+    st.sidebar.markdown("### Transcription")
+    model_choice = st.sidebar.selectbox(
+        "Model",
+        list(WHISPER_MODEL_OPTIONS.keys()),
+        index=0,
+        help="Distilled and turbo models have fewer decoder layers, so they decode faster per second of audio."
+    )
+    model_name = WHISPER_MODEL_OPTIONS[model_choice]
+    if model_name is None:
+        model_name = "distil-small.en" if source_lang == "English" else "base"
+    
+    decoding = st.sidebar.selectbox(
+        "Decoding",
+        list(BEAM_SIZE_OPTIONS.keys()),
+        index=0
+    )
+    st.sidebar.info(
+        f"In Auto mode, clips under {SHORT_CLIP_SECONDS // 60} minutes use fast greedy decoding; "
+        "longer clips use beam search (beam size 5) for better accuracy."
+    )
+    # Importing CTranslate2 to probe CUDA is slow, so the first render only looks for a
+    # driver; the model load confirms the device in the background
+    gpu_available = nvidia_driver_present()
+    use_gpu = st.sidebar.checkbox(
+        "Use GPU",
+        value=gpu_available,
+        disabled=not gpu_available,
+        help="Run transcription on a CUDA GPU (only available when one is detected)."
+    )
+    batch_size = st.sidebar.slider(
+        "Transcription batch size",
+        min_value=1,
+        max_value=32,
+        value=16 if use_gpu else 8,
+        help="Audio chunks transcribed together. Higher is faster but uses more memory."
+    )
+    
+    # Start loading the selected model now, so it is resident by the time a file is
+    # uploaded. Only submit when the model or device changes (or the last load failed),
+    # not on every rerun, so repeat loads don't pile up in the pool. The session only
+    # keeps the warm-up future (which returns None), never the model itself.
+    model_key = (model_name, use_gpu)
+    prewarm_future = st.session_state.get("prewarm_future")
+    if (
+        st.session_state.get("model_key") != model_key
+        or (prewarm_future.done() and prewarm_future.exception() is not None)
+    ):
+        st.session_state.prewarm_future = get_background_executor().submit(
+            prewarm_whisper_model, model_name, use_gpu
+        )
+        st.session_state.model_key = model_key
+    
     # File upload
     st.header("📁 Upload Audio File")
     uploaded_file = st.file_uploader(
@@ -418,7 +888,7 @@ def main():
     
     if uploaded_file is not None:
         # Display file info
-        file_size = len(uploaded_file.getvalue()) / (1024 * 1024)  # MB
+        file_size = uploaded_file.size / (1024 * 1024)  # MB
         st.success(f"File uploaded: {uploaded_file.name} ({file_size:.2f} MB)")
         st.audio(uploaded_file, format='audio/mp3')
         
@@ -436,114 +906,119 @@ def main():
             5. ⏳ Generating Audio Segments
             """)
             
-            # Create temporary directory for processing
-            with tempfile.TemporaryDirectory() as temp_dir:
-                try:
-                    # Step 1: Save uploaded file
-                    input_audio_path = os.path.join(temp_dir, "input_audio.mp3")
-                    with open(input_audio_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
-                    # Step 2: Transcribe audio
-                    steps.markdown("""
-                    1. ✅ **File Uploaded**
-                    2. ✅ **Dependencies Checked**
-                    3. ✅ **Transcribing Audio...**
-                    4. 🔄 Translating Text
-                    5. ⏳ Generating Audio Segments
-                    """)
-                    
-                    detected_language, segments = transcribe_audio(input_audio_path)
-                    
-                    if segments is None or len(segments) == 0:
-                        st.error("Transcription failed or no speech detected. Please try again with a different audio file.")
-                        return
-                    
-                    # Determine source language
-                    if source_lang == "Auto-detect":
-                        source_lang_code = detected_language
-                    else:
-                        source_lang_code = LANGUAGE_MAPPING[source_lang]
-                    
-                    st.info(f"Using source language: {source_lang_code}")
-                    
-                    # Step 3: Generate original subtitles
-                    original_subtitle_path = os.path.join(temp_dir, "original_subtitles.srt")
-                    if not generate_subtitle_file(segments, original_subtitle_path):
-                        return
-                    
-                    # Step 4: Translate subtitles
-                    steps.markdown("""
-                    1. ✅ **File Uploaded**
-                    2. ✅ **Dependencies Checked**
-                    3. ✅ **Transcribing Audio**
-                    4. ✅ **Translating Text...**
-                    5. 🔄 Generating Audio Segments
-                    """)
-                    
-                    translated_subtitle_path = os.path.join(temp_dir, "translated_subtitles.srt")
-                    target_lang_code = LANGUAGE_MAPPING[target_lang]
-                    
-                    if not translate_subtitles_googletrans(
-                        original_subtitle_path, 
-                        translated_subtitle_path, 
-                        target_lang_code,
-                        source_lang_code
-                    ):
-                        return
-                    
-                    # Step 5: Generate individual audio files
-                    steps.markdown("""
-                    1. ✅ **File Uploaded**
-                    2. ✅ **Dependencies Checked**
-                    3. ✅ **Transcribing Audio**
-                    4. ✅ **Translating Text**
-                    5. ✅ **Generating Audio Segments...**
-                    """)
-                    
-                    audio_files = generate_individual_audio_files(
-                        translated_subtitle_path,
-                        temp_dir,
-                        target_lang_code
-                    )
-                    
-                    if not audio_files:
-                        st.error("Failed to generate audio segments. Please try again.")
-                        return
-                    
-                    # Step 6: Create download page
-                    steps.markdown("""
-                    1. ✅ **File Uploaded**
-                    2. ✅ **Dependencies Checked**
-                    3. ✅ **Transcribing Audio**
-                    4. ✅ **Translating Text**
-                    5. ✅ **Generating Audio Segments**
-                    """)
-                    
-                    create_audio_download_page(audio_files, target_lang, source_lang_code)
+            try:
+                # Step 1: Identify the upload by content so repeat runs can reuse earlier results
+                content_key = hashlib.blake2b(uploaded_file.getbuffer(), digest_size=16).hexdigest()
+                
+                # Step 2: Transcribe audio
+                steps.markdown("""
+                1. ✅ **File Uploaded**
+                2. ✅ **Dependencies Checked**
+                3. ✅ **Transcribing Audio...**
+                4. 🔄 Translating Text
+                5. ⏳ Generating Audio Segments
+                """)
+                
+                # The upload is decoded straight from memory, without a copy on disk
+                uploaded_file.seek(0)
+                detected_language, segments = transcribe_audio(
+                    uploaded_file,
+                    content_key,
+                    model_name,
+                    use_gpu,
+                    batch_size,
+                    BEAM_SIZE_OPTIONS[decoding]
+                )
+                
+                if segments is None or len(segments) == 0:
+                    st.error("Transcription failed or no speech detected. Please try again with a different audio file.")
+                    return
+                
+                # Determine source language
+                if source_lang == "Auto-detect":
+                    source_lang_code = detected_language
+                else:
+                    source_lang_code = LANGUAGE_MAPPING[source_lang]
+                
+                st.info(f"Using source language: {CODE_TO_LANGUAGE.get(source_lang_code, source_lang_code)}")
+                
+                # Step 3: Translate subtitles
+                steps.markdown("""
+                1. ✅ **File Uploaded**
+                2. ✅ **Dependencies Checked**
+                3. ✅ **Transcribing Audio**
+                4. ✅ **Translating Text...**
+                5. 🔄 Generating Audio Segments
+                """)
+                
+                target_lang_code = LANGUAGE_MAPPING[target_lang]
+                
+                translated_segments = translate_subtitles_googletrans(
+                    segments,
+                    target_lang_code,
+                    source_lang_code
+                )
+                if translated_segments is None:
+                    return
+                
+                # Step 4: Generate individual audio files
+                steps.markdown("""
+                1. ✅ **File Uploaded**
+                2. ✅ **Dependencies Checked**
+                3. ✅ **Transcribing Audio**
+                4. ✅ **Translating Text**
+                5. ✅ **Generating Audio Segments...**
+                """)
+                
+                audio_files = generate_individual_audio_files(
+                    translated_segments,
+                    target_lang_code
+                )
+                
+                if not audio_files:
+                    st.error("Failed to generate audio segments. Please try again.")
+                    return
+                
+                # Step 5: Create download page
+                steps.markdown("""
+                1. ✅ **File Uploaded**
+                2. ✅ **Dependencies Checked**
+                3. ✅ **Transcribing Audio**
+                4. ✅ **Translating Text**
+                5. ✅ **Generating Audio Segments**
+                """)
+                
+                create_audio_download_page(
+                    audio_files,
+                    target_lang,
+                    target_lang_code,
+                    source_lang_code,
+                    segments,
+                    translated_segments
+                )
+                
+                # Show processing summary
+                st.markdown("---")
+                st.subheader("📊 Processing Summary")
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Segments Processed", len(segments))
+                with col2:
+                    st.metric("Audio Segments", len(audio_files))
+                with col3:
+                    st.metric("Source Language", CODE_TO_LANGUAGE.get(source_lang_code, source_lang_code))
+                with col4:
+                    st.metric("Target Language", target_lang)
                     
-                    # Show processing summary
-                    st.markdown("---")
-                    st.subheader("📊 Processing Summary")
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Segments Processed", len(segments))
-                    with col2:
-                        st.metric("Audio Segments", len(audio_files))
-                    with col3:
-                        st.metric("Source Language", source_lang_code)
-                    with col4:
-                        st.metric("Target Language", target_lang)
-                        
-                except Exception as e:
-                    st.error(f"Processing error: {str(e)}")
-                    st.info("""
-                    **Troubleshooting tips:**
-                    - Try a shorter audio file (under 1 minute)
-                    - Ensure the audio has clear speech
-                    - Check your internet connection (for translation)
-                    - Try MP3 format instead of WAV
-                    """)
+            except Exception as e:
+                st.error(f"Processing error: {str(e)}")
+                st.info("""
+                **Troubleshooting tips:**
+                - Try a shorter audio file (under 1 minute)
+                - Ensure the audio has clear speech
+                - Check your internet connection (for translation)
+                - Try MP3 format instead of WAV
+                """)
 
     else:
         # Instructions
@@ -554,8 +1029,7 @@ def main():
         2. **Select** target language (source is auto-detected)
         3. **Click** "Start Audio Dubbing"
         4. **Wait** for processing to complete
-        5. **Download** individual audio segments
-        6. **Combine** segments using free online tools
+        5. **Download** the combined dub or individual audio segments
         
         ### 📋 Supported Features:
         
@@ -569,8 +1043,7 @@ def main():
         
         - First run may take longer to load models
         - Internet required for translation
-        - Audio segments are provided separately
-        - Use free online tools to combine segments
+        - Segments are also provided separately for custom editing
         """)
 
     # Footer